@@ -1,13 +1,30 @@
+import torch
 import config
+import numpy as np
 from tqdm import tqdm
 from data import FrankeData
+from joblib import Parallel, delayed
 import matplotlib.pyplot as plt
-from regression import OrdinaryLeastSquares
-from bias_variance import bootstrap_bias_variance
+from bias_variance import (
+    bootstrap_bias_variance,
+    bootstrap_bias_variance_ols,
+    bootstrap_bias_variance_mlp,
+)
 from sklearn.neural_network import MLPRegressor
 from sklearn.ensemble import GradientBoostingRegressor
 
 
+def draw_seed():
+    """Draws a seed from np.random, so results seeded with it stay reproducible with np.random.seed
+
+    Returns
+    -------
+        seed : int
+            The seed
+    """
+    return np.random.randint(np.iinfo(np.int32).max)
+
+
 def plot(mses_train, mses_test, biases, variances, title=""):
     """Plots the bias variance analysis
 
@@ -46,8 +63,8 @@ def write_to_file(filename, x, mses_train, mses_test, biases, variances, x_label
     ----------
         filename : str
             Name of the file
-        x : list
-            List of the x values
+        x : list/range
+            The x values
         mses_train : list
             List of the mse-train values
         mses_test : list
@@ -59,29 +76,149 @@ def write_to_file(filename, x, mses_train, mses_test, biases, variances, x_label
         x_label : str
             Label of the x axis
     """
-    with open(f"output/data/{filename}", "w") as f:
-        f.write(f"{x_label},mse_train,mse_test,bias,variance\n")
-        for i in range(len(x)):
-            f.write(
-                f"{x[i]},{mses_train[i]},{mses_test[i]},{biases[i]},{variances[i]}\n"
-            )
+    np.savetxt(
+        f"output/data/{filename}",
+        np.column_stack([x, mses_train, mses_test, biases, variances]),
+        delimiter=",",
+        header=f"{x_label},mse_train,mse_test,bias,variance",
+        comments="",
+        fmt="%.17g",
+    )
+
+
+def bootstrap_mlp(model, data, seed=None):
+    """Bootstraps an MLP regressor, training all the bootstrap models at once on the gpu if one is available
+
+    Each bootstrap sample gets an independently initialized model. With config.MLP_WARM_START the model
+    is instead first fitted on all the training data, and then refitted on each bootstrap sample starting
+    from the previous weights, which is faster but correlates the models and so underestimates the variance.
+
+    Parameters
+    ----------
+        model : sklearn.neural_network.MLPRegressor
+            The model to bootstrap
+        data : data_generation.Data
+            The data for which to do the bootstrap
+        seed : int/None
+            Seeds np.random (the bootstrap samples and the weight initialization) if given
+
+    Returns
+    -------
+        bias : float
+            The bias of the bootstrap predictions for the test data
+        variance : float
+            The variance of the bootstrap predictions for the test data
+        mse_train : float
+            The mean squared error for the train data
+        mse_test : float
+            The mean squared error for the test data
+    """
+    if seed is not None:
+        np.random.seed(seed)
+
+    if config.MLP_WARM_START:
+        model.fit(data.X_train, data.y_train)
+        model.set_params(warm_start=True, max_iter=config.MLP_WARM_START_MAX_ITER)
+    elif torch.cuda.is_available():
+        return bootstrap_bias_variance_mlp(
+            model, data, config.BIAS_VARIANCE_BOOTSTRAP_SIZE
+        )
+
+    # the models are parallelized in bootstrap_mlps instead
+    return bootstrap_bias_variance(
+        model, data, config.BIAS_VARIANCE_BOOTSTRAP_SIZE, n_jobs=1
+    )
+
+
+def bootstrap_mlps(models, data):
+    """Bootstraps several MLP regressors, in parallel processes when running on the cpu
+
+    Parameters
+    ----------
+        models : list
+            The sklearn.neural_network.MLPRegressor models to bootstrap
+        data : data_generation.Data
+            The data for which to do the bootstrap
+
+    Returns
+    -------
+        biases : list
+            The bias for each model
+        variances : list
+            The variance for each model
+        mses_train : list
+            The mean squared error for the train data for each model
+        mses_test : list
+            The mean squared error for the test data for each model
+    """
+    # the seeds are drawn here to keep the results reproducible with np.random.seed
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=len(models))
+    on_gpu = torch.cuda.is_available() and not config.MLP_WARM_START
+    results = Parallel(n_jobs=1 if on_gpu else -1)(
+        delayed(bootstrap_mlp)(model, data, seed)
+        for model, seed in zip(tqdm(models), seeds)
+    )
+    return map(list, zip(*results))
+
+
+def bias_variance_ols_degree(degree, x, y, z, split_seed, seed=None):
+    """Bootstraps ordinary least squares for one polynomial degree
+
+    Parameters
+    ----------
+        degree : int
+            The polynomial degree of the design matrix
+        x : np.array
+            The x-values
+        y : np.array
+            The y-values
+        z : np.array
+            The z-values for the x- and y-values
+        split_seed : int
+            The seed for the train/test split
+        seed : int/None
+            Seeds np.random (the bootstrap samples) if given
+
+    Returns
+    -------
+        bias : float
+            The bias of the bootstrap predictions for the test data
+        variance : float
+            The variance of the bootstrap predictions for the test data
+        mse_train : float
+            The mean squared error for the train data
+        mse_test : float
+            The mean squared error for the test data
+    """
+    if seed is not None:
+        np.random.seed(seed)
+
+    data = FrankeData.from_arrays(
+        x,
+        y,
+        z,
+        degree=degree,
+        test_size=config.BIAS_VARIANCE_TEST_SIZE,
+        random_state=split_seed,
+    )
+    return bootstrap_bias_variance_ols(data, config.BIAS_VARIANCE_BOOTSTRAP_SIZE)
 
 
 def bias_variance_analysis_ols():
     """Performs the bias variance analysis for the ordinary least squares regression"""
-    mses_train, mses_test, biases, variances = [], [], [], []
-    degrees = list(range(1, 16))
-    for degree in degrees:
-        data = FrankeData(
-            config.DATA_SIZE, degree=degree, test_size=config.BIAS_VARIANCE_TEST_SIZE
-        )
-        bias, variance, mse_train, mse_test = bootstrap_bias_variance(
-            OrdinaryLeastSquares(), data, config.BIAS_VARIANCE_BOOTSTRAP_SIZE
-        )
-        mses_train.append(mse_train)
-        mses_test.append(mse_test)
-        biases.append(bias)
-        variances.append(variance)
+    degrees = range(1, 16)
+    # the samples and the train/test split are shared, so the degrees are comparable
+    # float64, as the float32 normal equations break down from around degree 8
+    x, y, z = FrankeData.generate_samples(config.DATA_SIZE, rng=draw_seed())
+    split_seed = draw_seed()
+    # the workers have their own np.random, so the bootstrap seeds are drawn here
+    seeds = [draw_seed() for _ in degrees]
+    # processes rather than threads, as numba's parallel loops may not be entered concurrently
+    results = Parallel(n_jobs=-1, backend="loky")(
+        delayed(bias_variance_ols_degree)(degree, x, y, z, split_seed, seed)
+        for degree, seed in zip(degrees, seeds)
+    )
+    biases, variances, mses_train, mses_test = map(list, zip(*results))
 
     write_to_file(
         "bias_variance_ols.csv",
@@ -96,21 +233,20 @@ def bias_variance_analysis_ols():
 
 def bias_variance_analysis_mlp_layer_size():
     """Performs the bias variance analysis for the MLP regression"""
-    mses_train, mses_test, biases, variances = [], [], [], []
-    data = FrankeData(config.DATA_SIZE, test_size=config.BIAS_VARIANCE_TEST_SIZE)
-    layer_sizes = list(range(10, 110, 10))
-    for layer_size in tqdm(layer_sizes):
-        bias, variance, mse_train, mse_test = bootstrap_bias_variance(
-            MLPRegressor(
-                hidden_layer_sizes=(layer_size for _ in range(3)), max_iter=1000
-            ),
-            data,
-            config.BIAS_VARIANCE_BOOTSTRAP_SIZE,
-        )
-        mses_train.append(mse_train)
-        mses_test.append(mse_test)
-        biases.append(bias)
-        variances.append(variance)
+    data = FrankeData(
+        config.DATA_SIZE,
+        test_size=config.BIAS_VARIANCE_TEST_SIZE,
+        dtype=np.float32,
+        seed=draw_seed(),
+    )
+    layer_sizes = range(10, 110, 10)
+    biases, variances, mses_train, mses_test = bootstrap_mlps(
+        [
+            MLPRegressor(hidden_layer_sizes=(layer_size,) * 3, max_iter=1000)
+            for layer_size in layer_sizes
+        ],
+        data,
+    )
 
     write_to_file(
         "bias_variance_mlp_layer_size.csv",
@@ -125,21 +261,20 @@ def bias_variance_analysis_mlp_layer_size():
 
 def bias_variance_analysis_mlp_number_of_layers():
     """Performs the bias variance analysis for the MLP regression"""
-    mses_train, mses_test, biases, variances = [], [], [], []
-    data = FrankeData(config.DATA_SIZE, test_size=config.BIAS_VARIANCE_TEST_SIZE)
-    number_of_layers_list = list(range(1, 6))
-    for number_of_layers in tqdm(number_of_layers_list):
-        bias, variance, mse_train, mse_test = bootstrap_bias_variance(
-            MLPRegressor(
-                hidden_layer_sizes=(50 for _ in range(number_of_layers)), max_iter=1000
-            ),
-            data,
-            config.BIAS_VARIANCE_BOOTSTRAP_SIZE,
-        )
-        mses_train.append(mse_train)
-        mses_test.append(mse_test)
-        biases.append(bias)
-        variances.append(variance)
+    data = FrankeData(
+        config.DATA_SIZE,
+        test_size=config.BIAS_VARIANCE_TEST_SIZE,
+        dtype=np.float32,
+        seed=draw_seed(),
+    )
+    number_of_layers_list = range(1, 6)
+    biases, variances, mses_train, mses_test = bootstrap_mlps(
+        [
+            MLPRegressor(hidden_layer_sizes=(50,) * number_of_layers, max_iter=1000)
+            for number_of_layers in number_of_layers_list
+        ],
+        data,
+    )
 
     write_to_file(
         "bias_variance_mlp_number_of_layers.csv",
@@ -161,8 +296,13 @@ def bias_variance_analysis_mlp():
 def bias_variance_analysis_ensamble():
     """Performs the bias variance analysis for the ensemble regression"""
     mses_train, mses_test, biases, variances = [], [], [], []
-    data = FrankeData(config.DATA_SIZE, test_size=config.BIAS_VARIANCE_TEST_SIZE)
-    depths = list(range(1, 11))
+    data = FrankeData(
+        config.DATA_SIZE,
+        test_size=config.BIAS_VARIANCE_TEST_SIZE,
+        dtype=np.float32,
+        seed=draw_seed(),
+    )
+    depths = range(1, 11)
     for depth in tqdm(depths):
         bias, variance, mse_train, mse_test = bootstrap_bias_variance(
             GradientBoostingRegressor(max_depth=depth),
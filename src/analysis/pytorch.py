@@ -52,7 +52,7 @@ def main():
 
     NUM_EPOCHS = 100
     SHOULD_TRANSFORM = True
-    EPOCHS = list(range(1, NUM_EPOCHS + 1))
+    EPOCHS = range(1, NUM_EPOCHS + 1)
 
     losses = np.empty(NUM_EPOCHS)
     accuracies = np.empty(NUM_EPOCHS)
@@ -1,16 +1,27 @@
+import torch
 import numpy as np
 from tqdm import tqdm
+from copy import deepcopy
+from numba import njit, prange
+from joblib import Parallel, delayed
+from regression import batched_mlp
 
 
-def bootstrap_bias_variance(model, data, bootstrap_N):
+def bootstrap_bias_variance(model, data, bootstrap_N, n_jobs=-1, backend="loky"):
     """Bootstrap method
 
     Parameters
     ----------
+        model :
+            The model to fit, needs a fit and a predict method
         data : data_generation.Data
             The data for which to do the bootstrap
         bootstrap_N : int
             The number of bootstrap samples to run
+        n_jobs : int
+            The number of parallel jobs for the bootstrap samples (-1 uses all cores, 1 runs sequentially)
+        backend : str
+            The joblib backend, "threading" suits models that spend their time in numpy/BLAS
 
     Returns
     -------
@@ -18,21 +29,249 @@ def bootstrap_bias_variance(model, data, bootstrap_N):
             An array containing z_tildes generated from the bootstrap
     """
     N = len(data.X_train)
+    # all the resamples in one call to the random generator
+    indices = np.random.randint(0, N, (bootstrap_N, N), dtype=np.int32)
+    # the models get their own seeds, as the workers do not share np.random with this process
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=bootstrap_N)
 
-    #  bootstrap_z_tilde = np.zeros((bootstrap_N, N))
-    bootstrap_z_tilde = np.empty((bootstrap_N, len(data.y_test)))
-    bootstrap_z_tilde_train = np.empty((bootstrap_N, len(data.y_train)))
+    # float32 is plenty for the predictions and halves the memory for the reductions
+    bootstrap_z_tilde = np.empty((bootstrap_N, len(data.y_test)), dtype=np.float32)
+    bootstrap_z_tilde_train = np.empty(
+        (bootstrap_N, len(data.y_train)), dtype=np.float32
+    )
+
+    if n_jobs == 1:
+        for i in tqdm(range(bootstrap_N), leave=False):
+            X_train = data.X_train[indices[i]]
+            y_train = data.y_train[indices[i]]
+
+            seed_model(model, seeds[i])
+            model.fit(X_train, y_train)
+            bootstrap_z_tilde[i] = model.predict(data.X_test)
+            bootstrap_z_tilde_train[i] = model.predict(data.X_train)
+    else:
+        # the indices and seeds are drawn up front to keep the results reproducible with np.random.seed
+        predictions = Parallel(n_jobs=n_jobs, backend=backend, batch_size="auto")(
+            delayed(fit_predict)(
+                model,
+                data.X_train,
+                data.y_train,
+                data.X_test,
+                indices[i],
+                seeds[i],
+            )
+            for i in tqdm(range(bootstrap_N), leave=False)
+        )
+        for i, (z_tilde, z_tilde_train) in enumerate(predictions):
+            bootstrap_z_tilde[i] = z_tilde
+            bootstrap_z_tilde_train[i] = z_tilde_train
+
+    return bootstrap_statistics(data, bootstrap_z_tilde, bootstrap_z_tilde_train)
+
+
+def bootstrap_bias_variance_ols(data, bootstrap_N):
+    """Bootstrap method for ordinary least squares, running the resamples in a compiled parallel loop
+
+    Parameters
+    ----------
+        data : data_generation.Data
+            The data for which to do the bootstrap
+        bootstrap_N : int
+            The number of bootstrap samples to run
+
+    Returns
+    -------
+        bias : float
+            The bias of the bootstrap predictions for the test data
+        variance : float
+            The variance of the bootstrap predictions for the test data
+        mse_train : float
+            The mean squared error for the train data
+        mse_test : float
+            The mean squared error for the test data
+    """
+    N = len(data.X_train)
+    indices = np.random.randint(0, N, (bootstrap_N, N), dtype=np.int32)
+
+    bootstrap_z_tilde, bootstrap_z_tilde_train = ols_bootstrap(
+        data.X_train, data.y_train, data.X_test, indices
+    )
+
+    return bootstrap_statistics(data, bootstrap_z_tilde, bootstrap_z_tilde_train)
+
+
+def bootstrap_bias_variance_mlp(model, data, bootstrap_N, device=None):
+    """Bootstrap method for MLP regression, training all the bootstrap models at once with pytorch
+
+    Parameters
+    ----------
+        model : sklearn.neural_network.MLPRegressor
+            The model whose hyperparameters (layers, activation, alpha, batch size, learning rate, max_iter, tol, n_iter_no_change) to use
+        data : data_generation.Data
+            The data for which to do the bootstrap
+        bootstrap_N : int
+            The number of bootstrap samples to run
+        device : torch.device/None
+            The device to train on, defaults to cuda if it is available
+
+    Returns
+    -------
+        bias : float
+            The bias of the bootstrap predictions for the test data
+        variance : float
+            The variance of the bootstrap predictions for the test data
+        mse_train : float
+            The mean squared error for the train data
+        mse_test : float
+            The mean squared error for the test data
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    N = len(data.X_train)
+    indices = np.random.randint(0, N, (bootstrap_N, N), dtype=np.int32)
+    # the weight initialization and the minibatches are seeded from np.random as well
+    torch.manual_seed(np.random.randint(np.iinfo(np.int32).max))
+
+    def to_torch(array):
+        return torch.as_tensor(array, dtype=torch.float32, device=device)
 
-    for i in tqdm(range(bootstrap_N), leave=False):
-        indices = np.random.randint(0, N, N)
+    X_train, X_test = to_torch(data.X_train), to_torch(data.X_test)
+    net = batched_mlp.BatchedMLP(
+        bootstrap_N,
+        X_train.shape[1],
+        tuple(model.hidden_layer_sizes),
+        activation=model.activation,
+    ).to(device)
+    batched_mlp.fit(
+        net,
+        to_torch(data.X_train[indices]),
+        to_torch(data.y_train[indices]),
+        max_iter=model.max_iter,
+        learning_rate=model.learning_rate_init,
+        alpha=model.alpha,
+        batch_size=model.batch_size if model.batch_size != "auto" else 200,
+        tol=model.tol,
+        n_iter_no_change=model.n_iter_no_change,
+    )
+
+    with torch.no_grad():
+        bootstrap_z_tilde = net(X_test.expand(bootstrap_N, -1, -1)).cpu().numpy()
+        bootstrap_z_tilde_train = net(X_train.expand(bootstrap_N, -1, -1)).cpu().numpy()
+
+    return bootstrap_statistics(data, bootstrap_z_tilde, bootstrap_z_tilde_train)
 
-        X_train = data.X_train[indices]
-        y_train = data.y_train[indices]
 
-        model.fit(X_train, y_train)
-        bootstrap_z_tilde[i] = model.predict(data.X_test)
-        bootstrap_z_tilde_train[i] = model.predict(data.X_train)
+@njit(parallel=True, fastmath=True, cache=True)
+def ols_bootstrap(X_train, y_train, X_test, indices):
+    """Fits ordinary least squares to resamples of the training data
+
+    Parameters
+    ----------
+        X_train : np.array
+            The training data
+        y_train : np.array
+            The training targets
+        X_test : np.array
+            The test data
+        indices : np.array
+            The indices of the training data in each bootstrap sample, one row per bootstrap sample
+
+    Returns
+    -------
+        bootstrap_z_tilde : np.array
+            The predictions for the test data, one row per bootstrap sample
+        bootstrap_z_tilde_train : np.array
+            The predictions for the train data, one row per bootstrap sample
+    """
+    bootstrap_N = indices.shape[0]
+    bootstrap_z_tilde = np.empty((bootstrap_N, X_test.shape[0]))
+    bootstrap_z_tilde_train = np.empty((bootstrap_N, X_train.shape[0]))
+
+    for i in prange(bootstrap_N):
+        X_sample = X_train[indices[i]]
+        y_sample = y_train[indices[i]]
 
+        # same normal equations as OrdinaryLeastSquares.fit
+        beta = np.linalg.pinv(X_sample.T @ X_sample) @ (X_sample.T @ y_sample)
+
+        bootstrap_z_tilde[i] = X_test @ beta
+        bootstrap_z_tilde_train[i] = X_train @ beta
+
+    return bootstrap_z_tilde, bootstrap_z_tilde_train
+
+
+def fit_predict(model, X_train, y_train, X_test, indices, seed=None):
+    """Fits a copy of the model on one bootstrap sample and predicts the test and train data
+
+    Parameters
+    ----------
+        model :
+            The model to fit, needs a fit and a predict method
+        X_train : np.array
+            The training data
+        y_train : np.array
+            The training targets
+        X_test : np.array
+            The test data
+        indices : np.array
+            The indices of the training data in the bootstrap sample
+        seed : int/None
+            The seed for np.random and the random_state of the model
+
+    Returns
+    -------
+        z_tilde : np.array
+            The predictions for the test data
+        z_tilde_train : np.array
+            The predictions for the train data
+    """
+    model = deepcopy(model)
+    if seed is not None:
+        # np.random of a worker process is not seeded by the parent
+        np.random.seed(seed)
+        seed_model(model, seed)
+    model.fit(X_train[indices], y_train[indices])
+    return model.predict(X_test), model.predict(X_train)
+
+
+def seed_model(model, seed):
+    """Sets the random_state of the model, if it has one
+
+    Parameters
+    ----------
+        model :
+            The model to seed
+        seed : int
+            The seed
+    """
+    if hasattr(model, "get_params") and "random_state" in model.get_params():
+        model.set_params(random_state=seed)
+
+
+def bootstrap_statistics(data, bootstrap_z_tilde, bootstrap_z_tilde_train):
+    """Reduces the bootstrap predictions to the bias, variance, and mean squared errors
+
+    Parameters
+    ----------
+        data : data_generation.Data
+            The data the bootstrap was done for
+        bootstrap_z_tilde : np.array
+            The predictions for the test data, one row per bootstrap sample
+        bootstrap_z_tilde_train : np.array
+            The predictions for the train data, one row per bootstrap sample
+
+    Returns
+    -------
+        bias : float
+            The bias of the bootstrap predictions for the test data
+        variance : float
+            The variance of the bootstrap predictions for the test data
+        mse_train : float
+            The mean squared error for the train data
+        mse_test : float
+            The mean squared error for the test data
+    """
     return (
         bias(data.y_test, bootstrap_z_tilde),
         variance(bootstrap_z_tilde),
@@ -56,7 +295,7 @@ def bias(z, z_tilde):
         bias : float
             The bias of the z and z_tilde
     """
-    return np.mean((z - np.mean(z_tilde, axis=0)) ** 2)
+    return np.mean((z - np.mean(z_tilde, axis=0, dtype=np.float64)) ** 2)
 
 
 def variance(z_tilde):
@@ -65,14 +304,14 @@ def variance(z_tilde):
     Parameters
     ----------
         z_tilde : np.array
-            The predicted z-tilde-values for which to calculate the variance
+            The predicted z-tilde-values for which to calculate the variance, one row per bootstrap sample
 
     Returns
     -------
         variance : float
-            The variance of the z_tilde
+            The variance of the z_tilde over the bootstrap samples, averaged over the data points
     """
-    return np.mean(np.var(z_tilde, axis=1))
+    return np.mean(np.var(z_tilde, axis=0, dtype=np.float64))
 
 
 def mse(z, z_tilde):
@@ -90,4 +329,4 @@ def mse(z, z_tilde):
         mse : float
             The mean squared error of the z and z_tilde
     """
-    return np.mean(np.mean((z - z_tilde) ** 2, axis=0))
+    return np.mean(np.mean((z - z_tilde) ** 2, axis=0, dtype=np.float64))
@@ -1,3 +1,5 @@
 BIAS_VARIANCE_BOOTSTRAP_SIZE = 100
 DATA_SIZE = 2000
 BIAS_VARIANCE_TEST_SIZE = 0.2
+MLP_WARM_START = False
+MLP_WARM_START_MAX_ITER = 200
@@ -10,7 +10,8 @@ class Data:
         """Empty initialized for the abstract data class"""
         self.test_size = None
 
-    def scale_data(self, data):
+    @staticmethod
+    def scale_data(data):
         """Scales the data by scaling to values from 0 to 1, then subtracting the mean
 
         Parameters
@@ -27,7 +28,7 @@ class Data:
         data -= np.mean(data)
         return data
 
-    def store_data(self, X, y, test_size, stratify=True):
+    def store_data(self, X, y, test_size, stratify=True, random_state=None):
         """Stores the data, either as only X, and y, or splitting the X, and z in train/test and saving all
 
         Parameters
@@ -38,6 +39,10 @@ class Data:
                 The y data to save
             test_size : float/None
                 The test size for which to store the data. None means no test data
+            stratify : bool
+                Whether to stratify the train/test split on y
+            random_state : int/None
+                The seed for the train/test split, the same seed gives the same split
         """
         self.test_size = test_size
         if not test_size:
@@ -50,7 +55,11 @@ class Data:
                 self._y_train,
                 self._y_test,
             ) = train_test_split(
-                X, y, test_size=test_size, stratify=y if stratify else None
+                X,
+                y,
+                test_size=test_size,
+                stratify=y if stratify else None,
+                random_state=random_state,
             )
 
     def create_train_test_loader(self, batch_size, transform=True):
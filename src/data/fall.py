@@ -1,12 +1,16 @@
 import os
+import cv2
 import torch
 import random
-import imageio
+import hashlib
+import tempfile
 import numpy as np
 import pandas as pd
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from data.abstract_data import Data
+from torch.utils.data import DataLoader
 from data.pytorch_dataset import PytorchDataset
-from skimage.transform import resize as sk_resize
 
 
 class FallData(Data):
@@ -20,6 +24,9 @@ class FallData(Data):
         for_pytorch=False,
         for_tensorflow=False,
         transform=True,
+        cache_path="output/cache",
+        lazy=False,
+        num_workers=4,
     ):
         """Initialize the fall dataset.
 
@@ -41,6 +48,12 @@ class FallData(Data):
                 Whether to return the dataset for Tensorflow.
             transform : bool
                 Whether to apply transformations to the data.
+            cache_path : str/None
+                The folder for caching the decoded motiongrams. None disables the cache.
+            lazy : bool
+                Whether to decode the motiongrams on the fly in the data loader workers instead of preloading them (only for Pytorch).
+            num_workers : int
+                The number of data loader workers when lazy loading.
         """
         super().__init__()
 
@@ -56,25 +69,24 @@ class FallData(Data):
         df = pd.read_csv(os.path.join(filepath, "fall_labels.csv"))
         filenames = df.loc[:, df.columns != "isfall"].values
 
-        X = np.zeros((len(filenames), 2, resize[0], resize[1]), dtype=np.float32)
         y = df.isfall.values
         y = y.astype(np.float32)
 
-        for i, filename in enumerate(filenames):
-            for j in range(2):
-                motiongram_np = imageio.imread(os.path.join(filepath, filename[j]))
-                motiongram_np = motiongram_np[:, :, 0]
-                motiongram_np = motiongram_np.astype(np.double)
-                motiongram_np = sk_resize(motiongram_np, resize)
-                if scale_data:
-                    motiongram_np = motiongram_np / np.max(motiongram_np)
-                X[i, j] = motiongram_np
+        paths = [[os.path.join(filepath, name) for name in pair] for pair in filenames]
+
+        if for_pytorch and lazy:
+            # only the paths are split, the loader workers decode the motiongrams
+            self.store_data(np.array(paths), y, test_size)
+            self.create_lazy_train_test_loader(
+                batch_size, resize, scale_data, transform, num_workers
+            )
+            return
+
+        X = self.load_motiongrams(paths, resize, scale_data, cache_path)
 
         if for_tensorflow:
-            X2 = np.zeros((len(filenames), resize[0], resize[1], 2), dtype=np.float32)
-            for i in range(X.shape[0]):
-                X2[i] = np.transpose(X[i], (2, 1, 0))
-            X = X2
+            # (N, channels, rows, columns) -> (N, rows, columns, channels)
+            X = np.ascontiguousarray(np.transpose(X, (0, 2, 3, 1)))
         elif for_pytorch:
             X, y = self.data_to_torch(X, y)
         else:
@@ -87,6 +99,156 @@ class FallData(Data):
         elif for_pytorch:
             self.create_train_test_loader(batch_size, transform)
 
+    def create_lazy_train_test_loader(
+        self, batch_size, resize, scale_data=True, transform=True, num_workers=4
+    ):
+        """Creates a train and test loader decoding the motiongrams on the fly.
+
+        Parameters
+        ----------
+            batch_size : int
+                The batch size for the data loader.
+            resize : tuple
+                The size (rows, columns) of the image to be resized.
+            scale_data : bool
+                Whether to scale the data to the range [0, 1].
+            transform : bool
+                Whether to apply transformations to the data.
+            num_workers : int
+                The number of worker processes decoding the motiongrams.
+        """
+        loader_options = dict(
+            batch_size=batch_size,
+            num_workers=num_workers,
+            pin_memory=torch.cuda.is_available(),
+            persistent_workers=num_workers > 0,
+        )
+
+        train_dataset = FallLazyDataset(
+            self.X_train,
+            self.y_train,
+            resize,
+            scale_data,
+            is_train=True if transform else None,
+            transform=transform,
+        )
+        test_dataset = FallLazyDataset(
+            self.X_test,
+            self.y_test,
+            resize,
+            scale_data,
+            is_train=False if transform else None,
+            transform=transform,
+        )
+
+        self.train_loader = DataLoader(train_dataset, shuffle=True, **loader_options)
+        self.test_loader = DataLoader(test_dataset, shuffle=False, **loader_options)
+
+    def load_motiongrams(self, paths, resize, scale_data=True, cache_path=None):
+        """Load all motiongrams, reusing a cached copy if the images have not changed.
+
+        Parameters
+        ----------
+            paths : list
+                The x- and y-motiongram paths for each sample.
+            resize : tuple
+                The size (rows, columns) of the image to be resized.
+            scale_data : bool
+                Whether to scale the data to the range [0, 1].
+            cache_path : str/None
+                The folder for caching the decoded motiongrams. None disables the cache.
+
+        Returns
+        -------
+            X : np.array
+                The motiongrams with shape (samples, 2, rows, columns).
+        """
+        if cache_path:
+            key = repr(
+                (
+                    [(path, os.path.getmtime(path)) for pair in paths for path in pair],
+                    tuple(resize),
+                    scale_data,
+                )
+            )
+            cache_file = os.path.join(
+                cache_path, f"fall_{hashlib.md5(key.encode()).hexdigest()}.npy"
+            )
+            if os.path.exists(cache_file):
+                # copy-on-write, so the arrays stay writable for torch
+                return np.load(cache_file, mmap_mode="c")
+
+        X = np.zeros((len(paths), 2, resize[0], resize[1]), dtype=np.float32)
+
+        # decoding is I/O- and C-bound (and releases the GIL), so threads are enough
+        tasks = [(i, j) for i in range(len(paths)) for j in range(2)]
+        load = partial(self.load_motiongram, resize=resize, scale_data=scale_data)
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for (i, j), motiongram in zip(
+                tasks, executor.map(load, [paths[i][j] for i, j in tasks])
+            ):
+                X[i, j] = motiongram
+
+        if cache_path:
+            try:
+                self.write_cache(cache_file, X)
+            except OSError:
+                # the motiongrams are already decoded, so a failing cache only costs the next run
+                pass
+
+        return X
+
+    @staticmethod
+    def write_cache(cache_file, X):
+        """Write the motiongrams to the cache without ever leaving a partial file behind.
+
+        Parameters
+        ----------
+            cache_file : str
+                The path of the cache file.
+            X : np.array
+                The motiongrams to cache.
+        """
+        cache_path = os.path.dirname(cache_file)
+        os.makedirs(cache_path, exist_ok=True)
+        # written next to the cache file and renamed, so an interrupted run leaves no truncated cache
+        file = tempfile.NamedTemporaryFile(dir=cache_path, suffix=".npy", delete=False)
+        try:
+            with file:
+                np.save(file, X)
+            os.replace(file.name, cache_file)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+
+    @staticmethod
+    def load_motiongram(path, resize, scale_data=True):
+        """Load a motiongram as a grayscale image and resize it.
+
+        Parameters
+        ----------
+            path : str
+                The path to the motiongram.
+            resize : tuple
+                The size (rows, columns) of the image to be resized.
+            scale_data : bool
+                Whether to scale the data to the range [0, 1].
+
+        Returns
+        -------
+            motiongram : np.array
+                The resized motiongram as a float32 array.
+        """
+        motiongram = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        assert motiongram is not None, f"Could not read the motiongram '{path}'"
+        # cv2 takes the size as (width, height)
+        motiongram = cv2.resize(
+            motiongram, (resize[1], resize[0]), interpolation=cv2.INTER_AREA
+        ).astype(np.float32)
+        if scale_data:
+            motiongram *= 1.0 / motiongram.max()
+        return motiongram
+
     def create_csv(self, filepath, random_seed=42):
         """Create a csv file with the filenames and labels.
 
@@ -120,3 +282,56 @@ class FallData(Data):
             random.shuffle(lines)
             for line in lines:
                 f.write(",".join(line) + "\n")
+
+
+class FallLazyDataset(PytorchDataset):
+    def __init__(
+        self, paths, y, resize, scale_data=True, is_train=None, transform=False
+    ):
+        """Initialize the lazy fall dataset, which decodes the motiongrams when they are accessed
+
+        Parameters
+        ----------
+            paths : numpy array
+                The x- and y-motiongram paths for each sample
+            y : numpy array
+                The labels
+            resize : tuple
+                The size (rows, columns) of the image to be resized
+            scale_data : bool
+                Whether to scale the data to the range [0, 1]
+            is_train : bool
+                Whether the dataset is for training or not
+            transform : bool
+                Whether to apply transformations to the data
+        """
+        super().__init__(paths, y, is_train=is_train, transform=transform)
+        self.resize = resize
+        self.scale_data = scale_data
+
+    def __getitem__(self, idx):
+        """Decode and return the item at the given index
+
+        Parameters
+        ----------
+            idx : int
+                The index of the item
+
+        Returns
+        -------
+            item : tuple
+                The item at the given index
+        """
+        X = torch.from_numpy(
+            np.stack(
+                [
+                    FallData.load_motiongram(path, self.resize, self.scale_data)
+                    for path in self.data[idx]
+                ]
+            )
+        )
+        y = torch.tensor(self.labels[idx])
+        if self.transform:
+            return self.make_transformation(X), y
+        else:
+            return X, y
@@ -1,4 +1,6 @@
 import numpy as np
+import numexpr as ne
+from numba import njit, prange
 from data.abstract_data import Data
 
 DEFAULT_NOISE_LEVEL = 0.2
@@ -13,6 +15,10 @@ class FrankeData(Data):
         scale_data=True,
         test_size=None,
         noise_level=DEFAULT_NOISE_LEVEL,
+        samples=None,
+        random_state=None,
+        dtype=np.float64,
+        seed=None,
     ):
         """The data class for the franke data
 
@@ -30,26 +36,111 @@ class FrankeData(Data):
                 Uses a specified size (0 to 1) as the test data
             noise_level : float
                 The sigma value for the noise level
+            samples : tuple(np.array, np.array, np.array)/None
+                Precomputed x, y, and z values (e.g. from generate_samples). If given, no new samples are drawn
+            random_state : int/None
+                The seed for the train/test split only (passed to sklearn's train_test_split)
+            dtype : np.dtype
+                The floating point type of the generated data (precomputed samples keep their own type)
+            seed : int/None
+                The seed for drawing the sample positions and the noise only, not used for the split or with samples
         """
         super().__init__()
 
         self.degree = degree
 
-        data = np.random.rand(N * 2).reshape(N, 2)
+        if samples is None:
+            samples = self.generate_samples(
+                N, random_noise, scale_data, noise_level, dtype=dtype, rng=seed
+            )
+        x, y, z = samples
+
+        self.store_data(x, y, z, test_size, random_state=random_state)
+
+    @classmethod
+    def from_arrays(cls, x, y, z, degree=1, test_size=None, random_state=None):
+        """Creates the data from already sampled values, only building the design matrix and splitting
+
+        Parameters
+        ----------
+            x : np.array
+                The x-values
+            y : np.array
+                The y-values
+            z : np.array
+                The z-values for the x- and y-values
+            degree : int
+                The polynomial degree of the design matrix
+            test_size : float/None
+                Uses a specified size (0 to 1) as the test data
+            random_state : int/None
+                The seed for the train/test split (the samples are given, so there is no sampling seed),
+                the same seed gives the same split for every degree
+
+        Returns
+        -------
+            data : FrankeData
+                The data for the given values
+        """
+        return cls(
+            len(x),
+            degree=degree,
+            test_size=test_size,
+            samples=(x, y, z),
+            random_state=random_state,
+        )
+
+    @staticmethod
+    def generate_samples(
+        N,
+        random_noise=True,
+        scale_data=True,
+        noise_level=DEFAULT_NOISE_LEVEL,
+        dtype=np.float64,
+        rng=None,
+    ):
+        """Draws random positions and evaluates the franke function for them
+
+        Parameters
+        ----------
+            N : int
+                The number of points to draw
+            random_noise : bool
+                Adds random noise if true
+            scale_data : bool
+                A bool specifying if the z-values should be scaled
+            noise_level : float
+                The sigma value for the noise level
+            dtype : np.dtype
+                The floating point type of the samples
+            rng : np.random.Generator/int/None
+                The random generator (or a seed for one) drawing the positions and the noise
+
+        Returns
+        -------
+            x : np.array
+                The x-values
+            y : np.array
+                The y-values
+            z : np.array
+                The z-values for the x- and y-values
+        """
+        rng = np.random.default_rng(rng)
+        data = rng.random((N, 2), dtype=dtype)
         x = data[:, 0]
         y = data[:, 1]
 
         if random_noise:
-            z = self.NoisyFrankeFunction(x, y, noise_level)
+            z = FrankeData.NoisyFrankeFunction(x, y, noise_level, rng=rng)
         else:
-            z = self.FrankeFunction(x, y)
+            z = FrankeData.FrankeFunction(x, y)
 
         if scale_data:
-            z = self.scale_data(z)
+            z = Data.scale_data(z)
 
-        self.store_data(x, y, z, test_size)
+        return x, y, z
 
-    def store_data(self, x, y, z, test_size):
+    def store_data(self, x, y, z, test_size, random_state=None):
         """Stores the data, either as only x, y, and z, or splitting the x, y, and z in train/test and saving all
 
         Parameters
@@ -62,12 +153,14 @@ class FrankeData(Data):
                 The z data to save
             test_size : float/None
                 The test size for which to store the data. None means no test data
+            random_state : int/None
+                The seed for the train/test split
         """
         x, y, z = np.ravel(x), np.ravel(y), np.ravel(z)
 
         X = self.generate_design_matrix(x, y)
 
-        super().store_data(X, z, test_size, stratify=False)
+        super().store_data(X, z, test_size, stratify=False, random_state=random_state)
 
     def get_number_of_parameters(self):
         return int((self.degree + 1) * (self.degree + 2) / 2)
@@ -87,15 +180,8 @@ class FrankeData(Data):
             X : np.array
                 The design matrix for the given x and y values
         """
-        N = len(x)
-        p = self.get_number_of_parameters()
-        X = np.ones((N, p))
-
-        for i in range(self.degree):
-            q = int((i + 1) * (i + 2) / 2)
-            for j in range(i + 2):
-                X[:, q + j] = x ** (i - j + 1) * y ** j
-
+        X = np.empty((len(x), self.get_number_of_parameters()), dtype=x.dtype)
+        fill_design_matrix(X, x, y, self.degree)
         return X
 
     @staticmethod
@@ -114,14 +200,23 @@ class FrankeData(Data):
             z : np.array
                 The z values from the franke function
         """
-        term1 = 0.75 * np.exp(-(0.25 * (9 * x - 2) ** 2) - 0.25 * ((9 * y - 2) ** 2))
-        term2 = 0.75 * np.exp(-((9 * x + 1) ** 2) / 49.0 - 0.1 * (9 * y + 1))
-        term3 = 0.5 * np.exp(-((9 * x - 7) ** 2) / 4.0 - 0.25 * ((9 * y - 3) ** 2))
-        term4 = -0.2 * np.exp(-((9 * x - 4) ** 2) - (9 * y - 7) ** 2)
-        return term1 + term2 + term3 + term4
+        # evaluated by numexpr in a single blocked, multithreaded pass without temporaries
+        # (the number of threads follows NUMEXPR_NUM_THREADS, which joblib sets in its workers)
+        return ne.evaluate(
+            "0.75 * exp(-(0.25 * (9 * x - 2) ** 2) - 0.25 * ((9 * y - 2) ** 2))"
+            " + 0.75 * exp(-((9 * x + 1) ** 2) / 49.0 - 0.1 * (9 * y + 1))"
+            " + 0.5 * exp(-((9 * x - 7) ** 2) / 4.0 - 0.25 * ((9 * y - 3) ** 2))"
+            " - 0.2 * exp(-((9 * x - 4) ** 2) - (9 * y - 7) ** 2)",
+            local_dict={"x": x, "y": y},
+            out=np.empty(
+                np.broadcast_shapes(np.shape(x), np.shape(y)),
+                dtype=np.result_type(x, y, np.float32),
+            ),
+            casting="same_kind",
+        )
 
     @staticmethod
-    def NoisyFrankeFunction(x, y, noise_level):
+    def NoisyFrankeFunction(x, y, noise_level, rng=None):
         """A noisy version of the franke function
 
         Parameters
@@ -132,17 +227,23 @@ class FrankeData(Data):
                 The y-values for which to generate z-values from the franke function
             noise_level : float
                 The sigma value for the amount of noise to add to the fnction
+            rng : np.random.Generator/int/None
+                The random generator (or a seed for one) drawing the noise
 
         Returns
         -------
             z : np.array
                 The z values from the franke function with added noise
         """
-        noise = FrankeData.generate_noise(x.shape, noise_level=noise_level)
-        return FrankeData.FrankeFunction(x, y) + noise
+        z = FrankeData.FrankeFunction(x, y)
+        # the noise follows the (floating point) type of z, not of the inputs
+        noise = FrankeData.generate_noise(
+            z.shape, noise_level=noise_level, dtype=z.dtype, rng=rng
+        )
+        return z + noise
 
     @staticmethod
-    def generate_noise(N, noise_level=DEFAULT_NOISE_LEVEL):
+    def generate_noise(N, noise_level=DEFAULT_NOISE_LEVEL, dtype=np.float64, rng=None):
         """Generates noise from a normal distribution
 
         Parameters
@@ -151,11 +252,42 @@ class FrankeData(Data):
                 The number of noises to add
             noise_level : float
                 The sigma value for the amount of noise to add to the fnction
+            dtype : np.dtype
+                The floating point type of the noise
+            rng : np.random.Generator/int/None
+                The random generator (or a seed for one) drawing the noise
 
         Returns
         -------
             noise : np.array
                 An array containing N values of noise with sigma noise_level
         """
-        noise = np.random.normal(loc=0.0, scale=noise_level, size=N)
+        noise = np.random.default_rng(rng).standard_normal(N, dtype=dtype)
+        noise *= noise_level
         return noise
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def fill_design_matrix(X, x, y, degree):
+    """Fills a design matrix row by row, each column costing a single multiplication
+
+    Parameters
+    ----------
+        X : np.array
+            The design matrix to fill, with (degree + 1) * (degree + 2) / 2 columns
+        x : np.array
+            The x values for which to generate the design matrix
+        y : np.array
+            The y values for which to generate the design matrix
+        degree : int
+            The polynomial degree of the design matrix
+    """
+    for n in prange(X.shape[0]):
+        X[n, 0] = 1
+        for i in range(degree):
+            # the terms of degree i + 1 are the terms of degree i times x, plus the last one times y
+            q_prev = i * (i + 1) // 2
+            q = (i + 1) * (i + 2) // 2
+            for j in range(i + 1):
+                X[n, q + j] = X[n, q_prev + j] * x[n]
+            X[n, q + i + 1] = X[n, q_prev + i] * y[n]
@@ -1,3 +1,4 @@
 #  from regression.ridge import Ridge
 #  from regression.lasso import Lasso
 from regression.ordinary_least_squares import OrdinaryLeastSquares
+from regression.batched_mlp import BatchedMLP
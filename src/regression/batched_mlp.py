@@ -0,0 +1,151 @@
+import torch
+import numpy as np
+import torch.nn as nn
+
+ACTIVATIONS = {
+    "identity": lambda x: x,
+    "logistic": torch.sigmoid,
+    "tanh": torch.tanh,
+    "relu": torch.relu,
+}
+
+
+class BatchedMLP(nn.Module):
+    def __init__(self, n_models, n_features, hidden_layer_sizes, activation="relu"):
+        """A stack of independent MLP regressors evaluated together with batched matrix products
+
+        Parameters
+        ----------
+            n_models : int
+                The number of independent models (eg. one per bootstrap sample)
+            n_features : int
+                The number of input features
+            hidden_layer_sizes : tuple
+                The number of neurons in each hidden layer
+            activation : str
+                The activation function for the hidden layers, named as in sklearn's MLPRegressor
+        """
+        super(BatchedMLP, self).__init__()
+
+        self.activation = ACTIVATIONS[activation]
+        self.weights = nn.ParameterList()
+        self.biases = nn.ParameterList()
+
+        layer_sizes = [n_features, *hidden_layer_sizes, 1]
+        for fan_in, fan_out in zip(layer_sizes[:-1], layer_sizes[1:]):
+            # glorot uniform initialization, as in sklearn
+            factor = 2 if activation == "logistic" else 6
+            bound = np.sqrt(factor / (fan_in + fan_out))
+            self.weights.append(
+                nn.Parameter(
+                    torch.empty(n_models, fan_in, fan_out).uniform_(-bound, bound)
+                )
+            )
+            self.biases.append(
+                nn.Parameter(torch.empty(n_models, 1, fan_out).uniform_(-bound, bound))
+            )
+
+    def forward(self, x):
+        """Forward pass of all the models
+
+        Parameters
+        ----------
+            x : torch.Tensor
+                The input with shape (n_models, n_samples, n_features)
+
+        Returns
+        -------
+            torch.Tensor
+                The predictions with shape (n_models, n_samples)
+        """
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation(torch.baddbmm(bias, x, weight))
+        return torch.baddbmm(self.biases[-1], x, self.weights[-1]).squeeze(-1)
+
+
+def fit(
+    model,
+    X,
+    y,
+    max_iter=200,
+    learning_rate=0.001,
+    alpha=0.0001,
+    batch_size=200,
+    tol=1e-4,
+    n_iter_no_change=10,
+):
+    """Train all the models with Adam on the squared error, mirroring sklearn's MLPRegressor
+
+    Like sklearn, a model stops training once its training loss has not improved by at least tol for
+    n_iter_no_change consecutive epochs, after which its weights are kept as they are.
+
+    Parameters
+    ----------
+        model : BatchedMLP
+            The models to train
+        X : torch.Tensor
+            The input with shape (n_models, n_samples, n_features)
+        y : torch.Tensor
+            The targets with shape (n_models, n_samples)
+        max_iter : int
+            The maximum number of epochs
+        learning_rate : float
+            The learning rate for Adam
+        alpha : float
+            The strength of the L2 penalty on the weights
+        batch_size : int
+            The size of the minibatches
+        tol : float
+            The tolerance for the improvement of the training loss
+        n_iter_no_change : int
+            The number of epochs without improvement before a model stops
+    """
+    n_models, N = X.shape[0], X.shape[1]
+    batch_size = min(batch_size, N)
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    best_loss = torch.full((n_models,), np.inf, device=X.device)
+    no_improvement_count = torch.zeros(n_models, dtype=torch.long, device=X.device)
+    stopped = torch.zeros(n_models, dtype=torch.bool, device=X.device)
+    # the weights of the stopped models, restored after every step
+    frozen = [parameter.detach().clone() for parameter in model.parameters()]
+
+    for _ in range(max_iter):
+        epoch_loss = torch.zeros(n_models, device=X.device)
+        permutation = torch.randperm(N, device=X.device)
+        for start in range(0, N, batch_size):
+            batch = permutation[start : start + batch_size]
+            optimizer.zero_grad()
+            # one sklearn-style loss per model, summed so each model gets its own gradient
+            loss = ((model(X[:, batch]) - y[:, batch]) ** 2).mean(dim=1) / 2
+            loss += (
+                alpha
+                * sum((weight ** 2).sum(dim=(1, 2)) for weight in model.weights)
+                / (2 * len(batch))
+            )
+            loss.sum().backward()
+            optimizer.step()
+            epoch_loss += loss.detach() * len(batch)
+
+            with torch.no_grad():
+                for parameter, frozen_parameter in zip(model.parameters(), frozen):
+                    parameter[stopped] = frozen_parameter[stopped]
+
+        # the no improvement rule of sklearn, per model
+        epoch_loss /= N
+        no_improvement = epoch_loss > best_loss - tol
+        no_improvement_count = torch.where(
+            no_improvement,
+            no_improvement_count + 1,
+            torch.zeros_like(no_improvement_count),
+        )
+        best_loss = torch.minimum(best_loss, epoch_loss)
+
+        newly_stopped = (no_improvement_count > n_iter_no_change) & ~stopped
+        with torch.no_grad():
+            for parameter, frozen_parameter in zip(model.parameters(), frozen):
+                frozen_parameter[newly_stopped] = parameter[newly_stopped]
+        stopped |= newly_stopped
+
+        if stopped.all():
+            break